@@ -1,15 +1,10 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, g
+from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from werkzeug.security import generate_password_hash
 
-admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
+from db import get_db
 
-def get_db():
-    db = getattr(g, '_database', None)
-    if db is None:
-        from app import get_db as app_get_db
-        db = app_get_db()
-    return db
+admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
 @admin_bp.before_request
 def admin_check():
@@ -1,14 +1,10 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, g
+from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 
-agent_bp = Blueprint('agent', __name__, url_prefix='/agent')
+from db import get_db
+from extensions import socketio
 
-def get_db():
-    db = getattr(g, '_database', None)
-    if db is None:
-        from app import get_db as app_get_db
-        db = app_get_db()
-    return db
+agent_bp = Blueprint('agent', __name__, url_prefix='/agent')
 
 @agent_bp.before_request
 def agent_check():
@@ -77,8 +73,6 @@ def close_chat(chat_id):
 
     # 2. [NEW] Notify the Widget via SocketIO that the chat is over
     try:
-        # Import inside function to avoid circular import with app.py
-        from app import socketio 
         print(f"[AGENT] Closing chat {chat_id}, emitting event...")
         socketio.emit('chat_closed', {'msg': 'Agent has ended the chat session.'}, room=chat_id)
     except Exception as e:
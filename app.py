@@ -1,137 +1,79 @@
+import time
+# Taken before monkey_patch and the heavy imports so STARTUP_MS covers a real cold start
+_cold_start_at = time.perf_counter()
+
 import eventlet
-eventlet.monkey_patch() # Must be the very first line
+eventlet.monkey_patch() # Must run before any other import
 
-import sqlite3
 import os
 import traceback
-from flask import Flask, g, render_template, request
-from flask_socketio import SocketIO, join_room, leave_room, emit
-from flask_login import LoginManager
+import zlib
+from flask import Flask, render_template, request
+from flask_socketio import join_room, leave_room, emit
 
-# --- CONFIGURATION ---
-app = Flask(__name__)
+from db import get_db, get_socket_db, close_connection, init_db
+from extensions import socketio, login_manager
 
-# [FIX] Use Environment Variable for security (with fallback for dev)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'project_cmr_secret_key_dev_fallback')
+# --- CONFIGURATION ---
 
 # Absolute path to DB to prevent path errors
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, 'cmr_database.db')
-app.config['DATABASE'] = DB_PATH
-
-# Initialize SocketIO with aggressive logging for debugging
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet', logger=True, engineio_logger=True)
-
-login_manager = LoginManager()
-login_manager.login_view = 'auth.login'
-login_manager.init_app(app)
-
-# --- DATABASE HELPERS ---
-
-def get_db():
-    """Request-based DB connection (for Flask routes)"""
-    db = getattr(g, '_database', None)
-    if db is None:
-        db = g._database = sqlite3.connect(app.config['DATABASE'])
-        db.row_factory = sqlite3.Row
-    return db
-
-def get_socket_db():
-    """Socket-based DB connection (Thread-safe)"""
-    try:
-        # check_same_thread=False is REQUIRED for SocketIO eventlet threads
-        db = sqlite3.connect(app.config['DATABASE'], check_same_thread=False)
-        db.row_factory = sqlite3.Row
-        return db
-    except Exception as e:
-        print(f"[CRITICAL DB ERROR] {e}")
-        return None
-
-@app.teardown_appcontext
-def close_connection(exception):
-    db = getattr(g, '_database', None)
-    if db is not None:
-        db.close()
 
-def init_db():
-    with app.app_context():
-        db = get_db()
-        cursor = db.cursor()
-        
-        # Define Tables
-        tables = [
-            '''CREATE TABLE IF NOT EXISTS projects (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                project_name TEXT NOT NULL,
-                client_name TEXT NOT NULL,
-                status TEXT DEFAULT 'active',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )''',
-            '''CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                project_id INTEGER, 
-                email TEXT UNIQUE NOT NULL,
-                name TEXT NOT NULL,
-                password TEXT NOT NULL,
-                role TEXT NOT NULL CHECK(role IN ('admin', 'agent')),
-                status TEXT DEFAULT 'offline',
-                FOREIGN KEY(project_id) REFERENCES projects(id)
-            )''',
-            '''CREATE TABLE IF NOT EXISTS chats (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                project_id INTEGER NOT NULL,
-                customer_name TEXT,
-                customer_email TEXT,
-                status TEXT DEFAULT 'queued',
-                assigned_agent_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(assigned_agent_id) REFERENCES users(id),
-                FOREIGN KEY(project_id) REFERENCES projects(id)
-            )''',
-            '''CREATE TABLE IF NOT EXISTS messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                chat_id INTEGER NOT NULL,
-                sender_type TEXT NOT NULL, 
-                sender_name TEXT,
-                message TEXT NOT NULL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(chat_id) REFERENCES chats(id)
-            )'''
-        ]
-        
-        for table in tables:
-            cursor.execute(table)
-            
-        db.commit()
-        print(f"Database initialized at: {DB_PATH}")
-
-# --- AUTH LOADER ---
-from auth import User
-@login_manager.user_loader
-def load_user(user_id):
-    db = get_db()
-    try:
-        cur = db.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-        user = cur.fetchone()
-        if user:
-            return User(user['id'], user['email'], user['name'], user['role'], user['project_id'], user['status'])
-    except:
-        pass
-    return None
-
-# --- BLUEPRINTS ---
-from auth import auth_bp
-from admin import admin_bp
-from agent import agent_bp
-from chat import chat_bp
+# [CONFIG] Worker cold start should stay under this (milliseconds). It is
+# measured from the top of this module, so eventlet's import and monkey_patch
+# (roughly half a second on their own) count against it.
+STARTUP_BUDGET_MS = float(os.environ.get('STARTUP_BUDGET_MS', '2000'))
+
+def create_app(config=None):
+    """Application factory. Everything a worker needs is resolved here, once."""
+    global _cold_start_at
+    # The first app in a process is timed from module load; any later ones
+    # (e.g. tests building several apps) are timed from this call
+    started = _cold_start_at or time.perf_counter()
+    _cold_start_at = None
+
+    app = Flask(__name__)
+    # [FIX] Use Environment Variable for security (with fallback for dev)
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'project_cmr_secret_key_dev_fallback')
+    app.config['DATABASE'] = DB_PATH
+    if config:
+        app.config.update(config)
+
+    # Verbose socket logging is opt-in; it slows every event when left on
+    socket_debug = os.environ.get('SOCKETIO_DEBUG', 'False') == 'True'
+    socketio.init_app(app, cors_allowed_origins="*", async_mode='eventlet',
+                      logger=socket_debug, engineio_logger=socket_debug)
+    login_manager.init_app(app)
+    app.teardown_appcontext(close_connection)
+
+    # Schema/migrations: no-op unless this deployment's DB is behind
+    init_db(app.config['DATABASE'])
+
+    # --- BLUEPRINTS ---
+    # Imported here so view modules load only when an app is actually built
+    from auth import auth_bp
+    from admin import admin_bp
+    from agent import agent_bp
+    from chat import chat_bp
+
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(agent_bp)
+    app.register_blueprint(chat_bp)
+    app.add_url_rule('/test', 'test_page', test_page)
+
+    # Compile the URL map now instead of on the first request
+    app.url_map.update()
+
+    startup_ms = (time.perf_counter() - started) * 1000
+    app.config['STARTUP_MS'] = startup_ms
+    if startup_ms > STARTUP_BUDGET_MS:
+        print(f"[WARNING] Startup took {startup_ms:.1f}ms (budget {STARTUP_BUDGET_MS:.0f}ms)")
+    else:
+        print(f"[STARTUP] Ready in {startup_ms:.1f}ms (PID: {os.getpid()})")
+    return app
 
-app.register_blueprint(auth_bp)
-app.register_blueprint(admin_bp)
-app.register_blueprint(agent_bp)
-app.register_blueprint(chat_bp)
-
-@app.route('/test')
 def test_page():
     db = get_db()
     projects = db.execute("SELECT * FROM projects").fetchall()
@@ -178,13 +120,70 @@ def find_best_agent(db, project_id):
     
     return None
 
+# --- MESSAGE ENVELOPES ---
+# Wire format for messages (short keys keep payloads small):
+#   i = messages.id, s = per-chat seq, t = sender code, m = text,
+#   z = 1 when m is zlib-compressed bytes, n = sender name (new_message)
+#   or index into the payload's name list (chat_history)
+
+# [CONFIG] Texts at least this long (UTF-8 bytes) are sent compressed
+COMPRESS_MIN_BYTES = 1024
+
+SENDER_CODES = {'customer': 'c', 'agent': 'a'}
+
+def save_message(db, chat_id, sender_type, sender_name, message):
+    """Inserts a message with the next seq for its chat. Returns (id, seq)."""
+    cur = db.execute('''
+        INSERT INTO messages (chat_id, seq, sender_type, sender_name, message)
+        VALUES (?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM messages WHERE chat_id = ?), ?, ?, ?)
+    ''', (chat_id, chat_id, sender_type, sender_name, message))
+    msg_id = cur.lastrowid
+    seq = db.execute("SELECT seq FROM messages WHERE id = ?", (msg_id,)).fetchone()[0]
+    return msg_id, seq
+
+def pack_message(msg_id, seq, sender_type, message):
+    envelope = {'i': msg_id, 's': seq, 't': SENDER_CODES.get(sender_type, sender_type), 'm': message}
+    raw = message.encode('utf-8')
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(raw)
+        if len(packed) < len(raw):
+            envelope['m'] = packed
+            envelope['z'] = 1
+    return envelope
+
+def emit_history(db, chat_id, after_seq=0, until_seq=None):
+    """Sends messages with after_seq < seq <= until_seq to the requesting client."""
+    query = "SELECT id, seq, sender_type, sender_name, message FROM messages WHERE chat_id = ? AND seq > ?"
+    params = [chat_id, after_seq]
+    if until_seq is not None:
+        query += " AND seq <= ?"
+        params.append(until_seq)
+    msgs = db.execute(query + " ORDER BY seq ASC", params).fetchall()
+
+    # Each sender name is sent once; rows refer to it by index
+    names = []
+    name_index = {}
+    history = []
+    for m in msgs:
+        name = m['sender_name']
+        if name not in name_index:
+            name_index[name] = len(names)
+            names.append(name)
+        row = pack_message(m['id'], m['seq'], m['sender_type'], m['message'])
+        row['n'] = name_index[name]
+        history.append(row)
+    emit('chat_history', {'c': chat_id, 'names': names, 'history': history}, room=request.sid)
+
 @socketio.on('connect')
 def handle_connect():
     print(f"[SOCKET] Client connected: {request.sid}")
 
 @socketio.on('join_chat')
 def handle_join_chat(data):
-    chat_id = data.get('chat_id')
+    try:
+        chat_id = int(data.get('chat_id'))
+    except (ValueError, TypeError):
+        return
     
     # [FIX] Validate Chat Status on Join & Load History
     db = get_socket_db()
@@ -198,11 +197,9 @@ def handle_join_chat(data):
             emit('chat_closed', {'msg': 'This session has expired.'}, room=request.sid)
             return
 
-        # [NEW] INSTANT LOAD: Send previous messages immediately
+        # [NEW] INSTANT LOAD: Send messages the client has not seen yet
         try:
-            msgs = db.execute("SELECT sender_type, message, sender_name FROM messages WHERE chat_id = ? ORDER BY timestamp ASC", (chat_id,)).fetchall()
-            history = [{'sender_type': m['sender_type'], 'message': m['message'], 'sender_name': m['sender_name']} for m in msgs]
-            emit('chat_history', {'history': history}, room=request.sid)
+            emit_history(db, chat_id, int(data.get('after_seq') or 0))
         except Exception as e:
             print(f"Error loading history: {e}")
 
@@ -212,6 +209,31 @@ def handle_join_chat(data):
         join_room(chat_id)
         print(f"[SOCKET] Client {request.sid} joined room: {chat_id}")
 
+@socketio.on('fetch_messages')
+def handle_fetch_messages(data):
+    """Gap fill: client asks for the seq range it detected as missing."""
+    try:
+        chat_id = int(data.get('chat_id'))
+        after_seq = int(data.get('after_seq') or 0)
+        until_seq = int(data['until_seq']) if data.get('until_seq') is not None else None
+    except (ValueError, TypeError):
+        return
+
+    db = get_socket_db()
+    if not db: return
+
+    try:
+        # Same rule as join_chat: closed (or unknown) chats do not hand out history
+        chat = db.execute("SELECT status FROM chats WHERE id = ?", (chat_id,)).fetchone()
+        if not chat or chat['status'] == 'closed':
+            emit('chat_closed', {'msg': 'This session has expired.'}, room=request.sid)
+            return
+        emit_history(db, chat_id, after_seq, until_seq)
+    except Exception as e:
+        print(f"Error fetching messages: {e}")
+    finally:
+        db.close()
+
 @socketio.on('create_chat')
 def handle_create_chat(data):
     print(f"\n[SOCKET] >>> create_chat EVENT RECEIVED from {request.sid}")
@@ -258,8 +280,7 @@ def handle_create_chat(data):
         chat_id = cur.lastrowid
         
         # 4. Save Message
-        db.execute("INSERT INTO messages (chat_id, sender_type, sender_name, message) VALUES (?, 'customer', ?, ?)", 
-                   (chat_id, name, initial_msg))
+        msg_id, seq = save_message(db, chat_id, 'customer', name, initial_msg)
         db.commit()
         
         # 5. Join Room & Notify
@@ -268,7 +289,9 @@ def handle_create_chat(data):
         emit('chat_created', {'chat_id': chat_id, 'status': status}) 
         
         # [NEW] Instant Echo: Show the user their own message immediately
-        socketio.emit('new_message', {'sender_type': 'customer', 'sender_name': name, 'message': initial_msg}, room=chat_id)
+        envelope = pack_message(msg_id, seq, 'customer', initial_msg)
+        envelope.update({'c': chat_id, 'n': name})
+        socketio.emit('new_message', envelope, room=chat_id)
         
         # Notify Agents
         if agent and agent_id:
@@ -287,7 +310,11 @@ def handle_create_chat(data):
 # [NEW] Handle when User clicks "Start Over" (ends the chat on server)
 @socketio.on('client_end_chat')
 def handle_client_end_chat(data):
-    chat_id = data.get('chat_id')
+    try:
+        chat_id = int(data.get('chat_id'))
+    except (ValueError, TypeError):
+        return
+
     db = get_socket_db()
     if not db: return
 
@@ -315,7 +342,10 @@ def handle_client_end_chat(data):
 
 @socketio.on('agent_claim_chat')
 def handle_agent_claim(data):
-    chat_id = data.get('chat_id')
+    try:
+        chat_id = int(data.get('chat_id'))
+    except (ValueError, TypeError):
+        return
     agent_id = data.get('agent_id')
     
     db = get_socket_db()
@@ -350,20 +380,25 @@ def handle_agent_message(data):
     handle_message(data, 'agent')
 
 def handle_message(data, sender_type):
-    chat_id = data.get('chat_id')
     message = data.get('message')
     sender_name = data.get('sender_name')
     
     if not message: return 
 
+    try:
+        chat_id = int(data.get('chat_id'))
+    except (ValueError, TypeError):
+        return
+
     db = get_socket_db()
     if not db: return
 
     try:
-        db.execute("INSERT INTO messages (chat_id, sender_type, sender_name, message) VALUES (?, ?, ?, ?)", 
-                (chat_id, sender_type, sender_name, message))
+        msg_id, seq = save_message(db, chat_id, sender_type, sender_name, message)
         db.commit()
-        socketio.emit('new_message', {'sender_type': sender_type, 'sender_name': sender_name, 'message': message}, room=chat_id)
+        envelope = pack_message(msg_id, seq, sender_type, message)
+        envelope.update({'c': chat_id, 'n': sender_name})
+        socketio.emit('new_message', envelope, room=chat_id)
     except Exception as e:
         print(f"Message Error: {e}")
     finally:
@@ -387,8 +422,9 @@ def register_agent(data):
             print(f"Agent Reg Error: {e}")
 
 # --- ENTRY POINT ---
+# Production: gunicorn --worker-class eventlet -w 1 'app:create_app()'
 if __name__ == '__main__':
-    init_db()
+    app = create_app()
     # [FIX] Do not force debug=True in production. 
     debug_mode = os.environ.get('FLASK_DEBUG', 'False') == 'True'
     print(f"Starting CMR Dashboard on http://localhost:5000 (PID: {os.getpid()})")
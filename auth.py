@@ -1,7 +1,10 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, g
+from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import check_password_hash, generate_password_hash
 
+from db import get_db
+from extensions import login_manager
+
 auth_bp = Blueprint('auth', __name__)
 
 class User(UserMixin):
@@ -13,12 +16,17 @@ class User(UserMixin):
         self.project_id = project_id
         self.status = status
 
-def get_db():
-    db = getattr(g, '_database', None)
-    if db is None:
-        from app import get_db as app_get_db
-        db = app_get_db()
-    return db
+@login_manager.user_loader
+def load_user(user_id):
+    db = get_db()
+    try:
+        cur = db.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+        user = cur.fetchone()
+        if user:
+            return User(user['id'], user['email'], user['name'], user['role'], user['project_id'], user['status'])
+    except:
+        pass
+    return None
 
 @auth_bp.route('/register', methods=['GET', 'POST'])
 def register():
@@ -1,14 +1,9 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, g
+from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 
-chat_bp = Blueprint('chat', __name__, url_prefix='/chat')
+from db import get_db
 
-def get_db():
-    db = getattr(g, '_database', None)
-    if db is None:
-        from app import get_db as app_get_db
-        db = app_get_db()
-    return db
+chat_bp = Blueprint('chat', __name__, url_prefix='/chat')
 
 @chat_bp.route('/<int:chat_id>')
 @login_required
@@ -40,6 +35,6 @@ def view_chat(chat_id):
             flash("System Error: Invalid Project ID data.")
             return redirect(url_for('agent.dashboard'))
 
-    messages = db.execute("SELECT * FROM messages WHERE chat_id = ? ORDER BY timestamp ASC", (chat_id,)).fetchall()
+    messages = db.execute("SELECT * FROM messages WHERE chat_id = ? ORDER BY seq ASC", (chat_id,)).fetchall()
     
     return render_template('chat.html', chat=chat, messages=messages)
\ No newline at end of file
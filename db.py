@@ -0,0 +1,129 @@
+import sqlite3
+from flask import current_app, g
+
+# --- SCHEMA ---
+# Each entry is one migration step. PRAGMA user_version records how many
+# steps have been applied, so a deployment only pays for schema work once
+# instead of every worker re-running CREATE TABLE on boot.
+MIGRATIONS = [
+    [
+        '''CREATE TABLE IF NOT EXISTS projects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_name TEXT NOT NULL,
+            client_name TEXT NOT NULL,
+            status TEXT DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+        '''CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER,
+            email TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            password TEXT NOT NULL,
+            role TEXT NOT NULL CHECK(role IN ('admin', 'agent')),
+            status TEXT DEFAULT 'offline',
+            FOREIGN KEY(project_id) REFERENCES projects(id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS chats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER NOT NULL,
+            customer_name TEXT,
+            customer_email TEXT,
+            status TEXT DEFAULT 'queued',
+            assigned_agent_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(assigned_agent_id) REFERENCES users(id),
+            FOREIGN KEY(project_id) REFERENCES projects(id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            sender_type TEXT NOT NULL,
+            sender_name TEXT,
+            message TEXT NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(chat_id) REFERENCES chats(id)
+        )'''
+    ],
+    [
+        # Routing + presence lookups (find_best_agent, agent dashboard queue)
+        "CREATE INDEX IF NOT EXISTS idx_users_presence ON users (project_id, role, status)",
+        "CREATE INDEX IF NOT EXISTS idx_chats_agent ON chats (assigned_agent_id, status)",
+        "CREATE INDEX IF NOT EXISTS idx_chats_queue ON chats (project_id, status)",
+        "CREATE INDEX IF NOT EXISTS idx_messages_chat ON messages (chat_id, id)"
+    ],
+    [
+        # Per-chat message sequence, lets clients detect gaps after reconnecting
+        "ALTER TABLE messages ADD COLUMN seq INTEGER",
+        '''UPDATE messages SET seq = (
+            SELECT COUNT(*) FROM messages m2
+            WHERE m2.chat_id = messages.chat_id AND m2.id <= messages.id
+        )''',
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_seq ON messages (chat_id, seq)"
+    ]
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Seconds a worker waits for another worker's migration to finish. Backfills
+# on a large messages table can take far longer than sqlite's 5s default.
+MIGRATION_TIMEOUT = 600
+
+# --- CONNECTION HELPERS ---
+
+def get_db():
+    """Request-based DB connection (for Flask routes)"""
+    db = getattr(g, '_database', None)
+    if db is None:
+        db = g._database = sqlite3.connect(current_app.config['DATABASE'])
+        db.row_factory = sqlite3.Row
+    return db
+
+def get_socket_db():
+    """Socket-based DB connection (Thread-safe)"""
+    try:
+        # check_same_thread=False is REQUIRED for SocketIO eventlet threads
+        db = sqlite3.connect(current_app.config['DATABASE'], check_same_thread=False)
+        db.row_factory = sqlite3.Row
+        return db
+    except Exception as e:
+        print(f"[CRITICAL DB ERROR] {e}")
+        return None
+
+def close_connection(exception):
+    db = getattr(g, '_database', None)
+    if db is not None:
+        db.close()
+
+def init_db(db_path):
+    """Applies pending migrations. Returns the number of steps applied.
+
+    Safe to call from every worker: the version check happens inside an
+    IMMEDIATE transaction, so only the first worker does any work and the
+    rest see an up-to-date user_version and return straight away.
+    """
+    db = sqlite3.connect(db_path, isolation_level=None, timeout=MIGRATION_TIMEOUT)
+    try:
+        if db.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return 0
+
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            version = db.execute("PRAGMA user_version").fetchone()[0]
+            for step in MIGRATIONS[version:]:
+                for stmt in step:
+                    db.execute(stmt)
+            # PRAGMA does not accept bound parameters
+            db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+        applied = SCHEMA_VERSION - version
+        if applied:
+            print(f"Database initialized at: {db_path} (schema v{SCHEMA_VERSION})")
+        return applied
+    finally:
+        db.close()
@@ -0,0 +1,9 @@
+from flask_socketio import SocketIO
+from flask_login import LoginManager
+
+# Created unbound so blueprints can import them without importing app.py.
+# create_app() binds both to the Flask instance.
+socketio = SocketIO()
+
+login_manager = LoginManager()
+login_manager.login_view = 'auth.login'
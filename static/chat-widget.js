@@ -87,6 +87,15 @@
     let chatId = localStorage.getItem(`cmr_chat_${projectId}`);
     let customerName = localStorage.getItem(`cmr_name_${projectId}`);
 
+    // Message ids already shown, for dedup. lastSeq: every seq up to here is rendered,
+    // so it is what we ask the server to continue from. maxSeq: highest seq seen, only
+    // used to notice gaps.
+    const SENDER_TYPES = { c: 'customer', a: 'agent' };
+    let seenIds = new Set();
+    let pendingSeqs = new Set();
+    let lastSeq = 0;
+    let maxSeq = 0;
+
     // Load Socket.io script
     const script = document.createElement('script');
     script.src = "https://cdn.socket.io/4.0.0/socket.io.min.js";
@@ -123,7 +132,7 @@
             console.log("✅ CMR Widget Connected! Socket ID:", socket.id);
             if (chatId) {
                 console.log("Rejoining previous chat session:", chatId);
-                socket.emit('join_chat', { chat_id: chatId });
+                socket.emit('join_chat', { chat_id: chatId, after_seq: lastSeq });
                 showChatInterface();
             }
         });
@@ -153,12 +162,12 @@
         
         // [NEW] Handle Loading History
         socket.on('chat_history', (data) => {
+            // Ignore payloads for a chat we have already left (e.g. after Start Over)
+            if (String(data.c) !== String(chatId)) return;
             console.log("Loading history...", data.history);
-            // Clear current messages to avoid duplicates
-            document.getElementById('cmr-messages').innerHTML = '';
-            
             data.history.forEach(msg => {
-                appendMessage(msg.message, msg.sender_type);
+                maxSeq = Math.max(maxSeq, msg.s);
+                appendMessage(msg);
             });
         });
         
@@ -171,8 +180,13 @@
             btn.disabled = false;
         });
 
-        socket.on('new_message', (data) => {
-            appendMessage(data.message, data.sender_type);
+        socket.on('new_message', (msg) => {
+            if (String(msg.c) !== String(chatId)) return;
+            if (msg.s > maxSeq + 1) {
+                socket.emit('fetch_messages', { chat_id: chatId, after_seq: lastSeq, until_seq: msg.s - 1 });
+            }
+            maxSeq = Math.max(maxSeq, msg.s);
+            appendMessage(msg);
         });
 
         socket.on('agent_assigned', (data) => {
@@ -216,6 +230,10 @@
         
         localStorage.removeItem(`cmr_chat_${projectId}`);
         chatId = null;
+        seenIds = new Set();
+        pendingSeqs = new Set();
+        lastSeq = 0;
+        maxSeq = 0;
         
         const input = document.getElementById('cmr-input');
         const sendBtn = document.getElementById('cmr-send');
@@ -288,15 +306,49 @@
         input.value = '';
     }
 
-    function appendMessage(msg, type) {
+    async function decodeText(msg) {
+        if (!msg.z) return msg.m;
+        const stream = new Blob([msg.m]).stream().pipeThrough(new DecompressionStream('deflate'));
+        return await new Response(stream).text();
+    }
+
+    async function appendMessage(msg) {
+        if (seenIds.has(msg.i)) return;
+        seenIds.add(msg.i);
+
         const div = document.createElement('div');
-        div.className = `cmr-msg cmr-msg-${type}`;
-        div.innerText = msg;
+        div.className = `cmr-msg cmr-msg-${SENDER_TYPES[msg.t] || msg.t}`;
+        div.dataset.seq = msg.s;
+        const forChat = chatId;
+        div.innerText = await decodeText(msg);
+        if (forChat !== chatId) return; // session was reset while decoding
+
+        // Gap fills can arrive after newer messages; keep the list in seq order
         const container = document.getElementById('cmr-messages');
-        container.appendChild(div);
+        const rendered = container.querySelectorAll('[data-seq]');
+        let placed = false;
+        for (let i = rendered.length - 1; i >= 0 && !placed; i--) {
+            if (Number(rendered[i].dataset.seq) < msg.s) {
+                if (i === rendered.length - 1) container.appendChild(div);
+                else rendered[i].after(div);
+                placed = true;
+            }
+        }
+        if (!placed) {
+            if (rendered.length) rendered[0].before(div);
+            else container.appendChild(div);
+        }
+        markRendered(msg.s);
         container.scrollTop = container.scrollHeight;
     }
 
+    // Advance lastSeq only across seqs that have actually been rendered
+    function markRendered(seq) {
+        if (seq <= lastSeq) return;
+        pendingSeqs.add(seq);
+        while (pendingSeqs.delete(lastSeq + 1)) lastSeq++;
+    }
+
     function appendSystemMessage(msg) {
         const div = document.createElement('div');
         div.className = `cmr-sys-msg`;
@@ -0,0 +1,28 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """One app per test session, backed by a throwaway database."""
+    from app import create_app
+
+    db_path = str(tmp_path_factory.mktemp('db') / 'cmr_test.db')
+    app = create_app({'DATABASE': db_path, 'TESTING': True})
+
+    db = sqlite3.connect(db_path)
+    db.execute("INSERT INTO projects (id, project_name, client_name) VALUES (1, 'Test', 'Client')")
+    db.execute("INSERT INTO chats (id, project_id, customer_name, status) VALUES (1, 1, 'Alice', 'queued')")
+    db.execute("INSERT INTO chats (id, project_id, customer_name, status) VALUES (2, 1, 'Bob', 'closed')")
+    db.execute("INSERT INTO chats (id, project_id, customer_name, status, assigned_agent_id) VALUES (3, 1, 'Carol', 'assigned', 99)")
+    db.execute("INSERT INTO chats (id, project_id, customer_name, status, assigned_agent_id) VALUES (4, 1, 'Dave', 'assigned', 99)")
+    db.execute("INSERT INTO chats (id, project_id, customer_name, status, assigned_agent_id) VALUES (5, 1, 'Erin', 'assigned', 99)")
+    db.execute("INSERT INTO messages (chat_id, seq, sender_type, sender_name, message) VALUES (1, 1, 'customer', 'Alice', 'Hello')")
+    db.execute("INSERT INTO messages (chat_id, seq, sender_type, sender_name, message) VALUES (2, 1, 'customer', 'Bob', 'Secret')")
+    db.commit()
+    db.close()
+    return app
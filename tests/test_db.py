@@ -0,0 +1,24 @@
+import sqlite3
+
+from db import MIGRATIONS, SCHEMA_VERSION, init_db
+
+def test_seq_backfill_on_baseline_database(tmp_path):
+    db_path = str(tmp_path / 'baseline.db')
+
+    # A database as the original init_db() left it: no seq column, user_version 0
+    db = sqlite3.connect(db_path)
+    for stmt in MIGRATIONS[0]:
+        db.execute(stmt)
+    for chat_id, text in [(1, 'a1'), (2, 'b1'), (1, 'a2'), (2, 'b2'), (1, 'a3'), (3, 'c1')]:
+        db.execute("INSERT INTO messages (chat_id, sender_type, message) VALUES (?, 'customer', ?)", (chat_id, text))
+    db.commit()
+    assert db.execute("PRAGMA user_version").fetchone()[0] == 0
+    db.close()
+
+    assert init_db(db_path) == SCHEMA_VERSION
+
+    db = sqlite3.connect(db_path)
+    rows = db.execute("SELECT chat_id, seq, message FROM messages ORDER BY id").fetchall()
+    assert db.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    db.close()
+    assert rows == [(1, 1, 'a1'), (2, 1, 'b1'), (1, 2, 'a2'), (2, 2, 'b2'), (1, 3, 'a3'), (3, 1, 'c1')]
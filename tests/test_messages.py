@@ -0,0 +1,76 @@
+import sqlite3
+import zlib
+
+def test_fetch_messages_returns_requested_range(app):
+    from app import socketio
+    client = socketio.test_client(app)
+    client.emit('fetch_messages', {'chat_id': '1', 'after_seq': 0, 'until_seq': 1})
+    received = client.get_received()
+    client.disconnect()
+
+    assert [e['name'] for e in received] == ['chat_history']
+    payload = received[0]['args'][0]
+    assert payload['names'] == ['Alice']
+    assert [(row['s'], row['n'], row['m']) for row in payload['history']] == [(1, 0, 'Hello')]
+
+def test_fetch_messages_refuses_closed_chat(app):
+    from app import socketio
+    client = socketio.test_client(app)
+    client.emit('fetch_messages', {'chat_id': 2, 'after_seq': 0})
+    received = client.get_received()
+    client.disconnect()
+
+    assert [e['name'] for e in received] == ['chat_closed']
+
+def test_client_end_chat_reaches_room_with_string_id(app):
+    from app import socketio
+    agent = socketio.test_client(app)
+    agent.emit('join_chat', {'chat_id': 3})
+    agent.get_received()
+
+    # The widget reads chat_id back from localStorage as a string
+    widget = socketio.test_client(app)
+    widget.emit('client_end_chat', {'chat_id': '3'})
+    received = agent.get_received()
+    agent.disconnect()
+    widget.disconnect()
+
+    assert 'chat_closed' in [e['name'] for e in received]
+
+def test_new_message_carries_id_and_per_chat_seq(app):
+    from app import socketio
+    client = socketio.test_client(app)
+    client.emit('join_chat', {'chat_id': 4})
+    client.emit('join_chat', {'chat_id': 5})
+    client.get_received()
+
+    client.emit('client_message', {'chat_id': '4', 'message': 'one', 'sender_name': 'Dave'})
+    client.emit('agent_message', {'chat_id': 4, 'message': 'two', 'sender_name': 'Agent'})
+    client.emit('agent_message', {'chat_id': 5, 'message': 'first', 'sender_name': 'Agent'})
+    client.emit('client_message', {'chat_id': 4, 'message': 'three', 'sender_name': 'Dave'})
+    client.emit('client_message', {'chat_id': 5, 'message': 'second', 'sender_name': 'Erin'})
+    received = [e['args'][0] for e in client.get_received() if e['name'] == 'new_message']
+    client.disconnect()
+
+    assert [(m['c'], m['s'], m['t'], m['m']) for m in received] == [
+        (4, 1, 'c', 'one'), (4, 2, 'a', 'two'), (5, 1, 'a', 'first'),
+        (4, 3, 'c', 'three'), (5, 2, 'c', 'second'),
+    ]
+
+    # i is the persisted messages.id for that (chat, seq)
+    db = sqlite3.connect(app.config['DATABASE'])
+    rows = dict(((c, s), i) for i, c, s in db.execute("SELECT id, chat_id, seq FROM messages WHERE chat_id IN (4, 5)"))
+    db.close()
+    assert [m['i'] for m in received] == [rows[(m['c'], m['s'])] for m in received]
+
+def test_pack_message_compresses_long_texts_only(app):
+    from app import COMPRESS_MIN_BYTES, pack_message
+    long_text = 'hello world ' * (COMPRESS_MIN_BYTES // 10)
+    packed = pack_message(7, 3, 'agent', long_text)
+    assert packed['z'] == 1
+    assert isinstance(packed['m'], bytes)
+    assert zlib.decompress(packed['m']).decode('utf-8') == long_text
+    assert (packed['i'], packed['s'], packed['t']) == (7, 3, 'a')
+
+    short = pack_message(8, 4, 'customer', 'hi')
+    assert short == {'i': 8, 's': 4, 't': 'c', 'm': 'hi'}
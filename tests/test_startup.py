@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# [CONFIG] Worker cold start (import app.py -> app built), in a fresh process
+COLD_START_BUDGET_MS = 2000
+
+# [CONFIG] Connect -> first event round trip for a freshly started worker
+FIRST_EVENT_BUDGET_MS = 250
+
+def test_cold_start_within_budget(tmp_path):
+    # A new interpreter, like a gunicorn worker, so nothing is already imported
+    code = (
+        "from app import create_app; "
+        f"app = create_app({{'DATABASE': {str(tmp_path / 'cold.db')!r}}}); "
+        "print(app.config['STARTUP_MS'])"
+    )
+    result = subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR,
+                            capture_output=True, text=True, check=True)
+    startup_ms = float(result.stdout.strip().splitlines()[-1])
+    assert startup_ms < COLD_START_BUDGET_MS
+
+def test_schema_init_runs_once(app):
+    from db import init_db
+    # Migrations were applied when the app was built; a second worker is a no-op
+    assert init_db(app.config['DATABASE']) == 0
+
+def test_time_to_first_event(app):
+    from app import socketio
+    started = time.perf_counter()
+    client = socketio.test_client(app)
+    client.emit('join_chat', {'chat_id': 1})
+    received = client.get_received()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    client.disconnect()
+
+    assert received and received[0]['name'] == 'chat_history'
+    assert elapsed_ms < FIRST_EVENT_BUDGET_MS